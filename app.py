@@ -1,5 +1,6 @@
 # KCRH_App.py (Corrected First Half)
 # Kisumu County Referral Hospital - Streamlit App
+# Requires Python 3.10+ (slotted dataclasses) and streamlit>=1.37 (see requirements.txt).
 # Combines referral system, ambulance tracking, communications, handover forms,
 # mapping, analytics and offline sync (demo / simulation version).
 
@@ -7,37 +8,82 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 import datetime
-import random
-from typing import List, Dict
+import dateutil.tz
+from typing import List, Dict, Optional, Tuple
+from dataclasses import dataclass, field, InitVar
 import time
 import io
+import os
+import logging
+from collections import deque, defaultdict
 
 # Mapping & geolocation
-import folium
 from geopy.distance import geodesic
 import streamlit.components.v1 as components
+from geo import haversine_km
 
 # Visualization
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+
+# Must run before any other Streamlit call, including cached-resource spinners below
+st.set_page_config(page_title="Kisumu County Referral System", layout="wide")
 
 # Faker for simulated content
 from faker import Faker
-faker = Faker()
+
+
+@st.cache_resource
+def get_faker():
+    return Faker()
+
+
+faker = get_faker()
 
 # PDF generation
 from fpdf import FPDF
 
+
+@st.cache_resource
+def get_sim_rng(raw_seed: Optional[str]):
+    # Built once per process; a bad seed is reported here, so only once, in the server log
+    seed = None
+    if raw_seed:
+        try:
+            seed = int(raw_seed)
+        except ValueError:
+            seed = -1
+        if seed < 0:
+            logging.getLogger(__name__).warning(
+                "Ignoring KCRH_SIM_SEED=%r: expected a non-negative integer.", raw_seed)
+            seed = None
+    return np.random.default_rng(seed)
+
+
+# One jitter stream shared by every session in the process. KCRH_SIM_SEED fixes where
+# it starts, but each session's draws depend on how sessions interleave.
+_RNG = get_sim_rng(os.environ.get("KCRH_SIM_SEED"))
+
 # -----------------------------
 # Core data classes
 # -----------------------------
+HISTORY_COLUMNS = [
+    "Patient", "From Hospital", "To Hospital", "Ambulance",
+    "Status", "Request Time", "Completion Time"
+]
+
+@dataclass(slots=True, eq=False)
 class Hospital:
-    def __init__(self, name, location, capacity, hospital_type="general"):
-        self.name = name
-        self.location = location  # (lat, lon)
-        self.capacity = capacity
-        self.available_beds = capacity
+    name: str
+    location: Tuple[float, float]  # (lat, lon)
+    capacity: int
+    hospital_type: InitVar[str] = "general"
+    available_beds: int = field(init=False)
+    type: str = field(init=False)
+    referrals_received: list = field(init=False, default_factory=list)
+
+    def __post_init__(self, hospital_type):
+        self.available_beds = self.capacity
         self.type = hospital_type
-        self.referrals_received = []
 
     def admit_patient(self, patient):
         if self.available_beds > 0:
@@ -56,25 +102,33 @@ class Hospital:
         return False
 
 
+@dataclass(slots=True, eq=False)
 class Patient:
-    def __init__(self, name, condition, severity, vital_signs=None):
-        self.name = name
-        self.condition = condition
-        self.severity = severity
-        self.vital_signs = vital_signs or {}
-        self.status = "waiting"
-        self.transfer_completion_time = None
+    name: str
+    condition: str
+    severity: int
+    vital_signs: dict = field(default_factory=dict)
+    status: str = field(init=False, default="waiting")
+    transfer_completion_time: Optional[int] = field(init=False, default=None)  # epoch ns
+
+    def __post_init__(self):
+        if self.vital_signs is None:
+            self.vital_signs = {}
 
 
+@dataclass(slots=True, eq=False)
 class Ambulance:
-    def __init__(self, amb_id, location):
+    amb_id: InitVar[str]
+    location: Tuple[float, float]
+    id: str = field(init=False)
+    status: str = field(init=False, default="available")  # available, dispatched, en_route, arrived
+    current_patient: Optional[Patient] = field(init=False, default=None)
+    destination: Optional[Hospital] = field(init=False, default=None)
+    route: np.ndarray = field(init=False, default_factory=lambda: np.empty((0, 2)))  # (N, 2) lat/lon
+    eta: Optional[datetime.datetime] = field(init=False, default=None)
+
+    def __post_init__(self, amb_id):
         self.id = amb_id
-        self.location = location
-        self.status = "available"  # available, dispatched, en_route, arrived
-        self.current_patient = None
-        self.destination = None
-        self.route = []
-        self.eta = None
 
     def dispatch(self, patient, destination):
         self.status = "dispatched"
@@ -84,11 +138,48 @@ class Ambulance:
     def complete_transfer(self):
         self.status = "available"
         if self.current_patient:
-            self.current_patient.transfer_completion_time = datetime.datetime.now()
+            self.current_patient.transfer_completion_time = time.time_ns()
         self.current_patient = None
         self.destination = None
 
 
+@dataclass(slots=True)
+class Message:
+    id: int
+    sender: str
+    recipient: str
+    type: str
+    content: str
+    urgent: bool
+    timestamp: int  # epoch ns
+    read: bool = False
+
+
+@dataclass
+class HospitalTable:
+    """Hospital names in insertion order plus a name -> position index.
+
+    Mutable hospital state (beds, coordinates, capacity) stays on the Hospital objects.
+    """
+    names: np.ndarray = field(default_factory=lambda: np.empty(4, dtype=object))
+    index: Dict[str, int] = field(default_factory=dict)
+    size: int = 0
+
+    def add(self, name):
+        if self.size == len(self.names):
+            grown = np.empty(2 * len(self.names), dtype=object)
+            grown[:self.size] = self.names[:self.size]
+            self.names = grown
+        i = self.size
+        self.names[i] = name
+        self.index[name] = i
+        self.size += 1
+        return i
+
+    def column(self, col):
+        return getattr(self, col)[:self.size]
+
+
 # -----------------------------
 # Specialized systems
 # -----------------------------
@@ -96,20 +187,53 @@ class ReferralSystem:
     def __init__(self):
         self.hospitals: List[Hospital] = []
         self.ambulances: List[Ambulance] = []
+        self._available: deque = deque()  # ambulances free for dispatch, in FIFO order
         self.referral_requests: List[Dict] = []
-        self.referral_history = pd.DataFrame(columns=[
-            "Patient", "From Hospital", "To Hospital", "Ambulance",
-            "Status", "Request Time", "Completion Time"
-        ])
+        self.hosp_table = HospitalTable()
+        # Completed referrals are kept as plain dicts; the DataFrame is built on demand
+        self._history_rows: List[Dict] = []
+        self.history_version = 0
+        self._history_df = None
+        self._history_df_version = -1
+
+    @property
+    def referral_history(self):
+        # Rebuilt only after a new completion; treat the returned frame as read-only.
+        # Time columns hold int64 epoch nanoseconds, see history_for_display.
+        if self._history_df_version != self.history_version:
+            self._history_df = pd.DataFrame(self._history_rows, columns=HISTORY_COLUMNS)
+            self._history_df_version = self.history_version
+        return self._history_df
+
+    def iter_history(self):
+        """Completed referral rows as dicts, without building a DataFrame."""
+        return iter(self._history_rows)
 
     def add_hospital(self, hospital: Hospital):
         self.hospitals.append(hospital)
+        self.hosp_table.add(hospital.name)
+
+    @property
+    def hosp_index(self):
+        return self.hosp_table.index
+
+    @property
+    def hosp_names(self):
+        return self.hosp_table.column("names")
+
+    def hospital_by_name(self, name):
+        return self.hospitals[self.hosp_index[name]]
 
     def add_ambulance(self, ambulance: Ambulance):
         self.ambulances.append(ambulance)
+        if ambulance.status == "available":
+            self._available.append(ambulance)
 
     def find_available_ambulance(self):
-        return next((amb for amb in self.ambulances if amb.status == "available"), None)
+        # Drop stale entries for ambulances dispatched outside the queue
+        while self._available and self._available[0].status != "available":
+            self._available.popleft()
+        return self._available[0] if self._available else None
 
     def create_referral(self, patient: Patient, from_hospital: Hospital, to_hospital: Hospital, ambulance: Ambulance=None):
         amb = ambulance or self.find_available_ambulance()
@@ -122,11 +246,15 @@ class ReferralSystem:
             "from_hospital": from_hospital,
             "to_hospital": to_hospital,
             "ambulance": amb,
-            "timestamp": datetime.datetime.now(),
+            "timestamp": time.time_ns(),
             "status": "in_transit"
         }
 
         amb.dispatch(patient, to_hospital)
+        if self._available and self._available[0] is amb:
+            self._available.popleft()
+        elif amb in self._available:
+            self._available.remove(amb)
         self.referral_requests.append(referral)
         return referral
 
@@ -135,9 +263,12 @@ class ReferralSystem:
         if not referral:
             return None
 
-        referral["ambulance"].complete_transfer()
+        amb = referral["ambulance"]
+        if amb.status != "available":
+            self._available.append(amb)
+        amb.complete_transfer()
         referral["status"] = "completed"
-        completion_time = datetime.datetime.now()
+        completion_time = time.time_ns()
 
         new_entry = {
             "Patient": referral["patient"].name,
@@ -148,7 +279,8 @@ class ReferralSystem:
             "Request Time": referral["timestamp"],
             "Completion Time": completion_time
         }
-        self.referral_history = pd.concat([self.referral_history, pd.DataFrame([new_entry])], ignore_index=True)
+        self._history_rows.append(new_entry)
+        self.history_version += 1
         return referral
 
 
@@ -156,9 +288,10 @@ class AmbulanceTracker:
     def __init__(self, system: ReferralSystem):
         self.system = system
 
-    def calculate_distance(self, loc1, loc2):
-        return geodesic(loc1, loc2).km
-
+    def calculate_distance(self, loc1, loc2, precise=False):
+        if precise:
+            return geodesic(loc1, loc2).km
+        return float(haversine_km(float(loc1[0]), float(loc1[1]), float(loc2[0]), float(loc2[1])))
     def simulate_movement(self, ambulance: Ambulance, dest_loc, speed_kmh=60):
         distance_km = self.calculate_distance(ambulance.location, dest_loc)
         minutes = (distance_km / speed_kmh) * 60
@@ -168,35 +301,28 @@ class AmbulanceTracker:
         return {"distance_km": distance_km, "eta": ambulance.eta}
 
     def generate_route(self, start, end, num_points=6):
-        lat_diff = (end[0] - start[0]) / (num_points + 1)
-        lon_diff = (end[1] - start[1]) / (num_points + 1)
-        pts = []
-        for i in range(1, num_points + 1):
-            pts.append((start[0] + lat_diff * i + random.uniform(-0.0005, 0.0005),
-                        start[1] + lon_diff * i + random.uniform(-0.0005, 0.0005)))
-        return pts
+        # Evenly spaced interior points between start and end, with small jitter
+        base = np.linspace(np.asarray(start, dtype=float), np.asarray(end, dtype=float), num_points + 2)[1:-1]
+        jitter = _RNG.uniform(-0.0005, 0.0005, base.shape)
+        return base + jitter
 
 
 class CommunicationSystem:
     def __init__(self):
         self.messages = []
+        self._by_recipient = defaultdict(list)
+        self._next_id = 1
 
     def send_message(self, sender, recipient, message_type, content, urgent=False):
-        msg = {
-            "id": len(self.messages) + 1,
-            "sender": sender,
-            "recipient": recipient,
-            "type": message_type,
-            "content": content,
-            "urgent": urgent,
-            "timestamp": datetime.datetime.now(),
-            "read": False
-        }
+        msg = Message(self._next_id, sender, recipient, message_type, content, urgent,
+                      time.time_ns())
+        self._next_id += 1
         self.messages.append(msg)
+        self._by_recipient[recipient].append(msg)
         return msg
 
     def get_messages_for(self, recipient):
-        return [m for m in self.messages if m["recipient"] == recipient]
+        return list(self._by_recipient.get(recipient, ()))
 
 
 # -----------------------------
@@ -218,40 +344,142 @@ if 'patients' not in st.session_state:
     ]
 patients = st.session_state.patients
 
+if 'patients_by_name' not in st.session_state:
+    st.session_state.patients_by_name = {p.name: p for p in patients}
+patients_by_name = st.session_state.patients_by_name
+
 # -----------------------------
 # Helper function
 # -----------------------------
 def referrals_to_df(system: ReferralSystem):
-    if system.referral_history.empty:
-        return pd.DataFrame(columns=["Patient", "From Hospital", "To Hospital", "Ambulance", "Status", "Request Time", "Completion Time"])
-    return system.referral_history.copy()
+    return system.referral_history
+
+
+# System local zone with its DST rules, not a fixed offset
+_LOCAL_TZ = dateutil.tz.tzlocal()
+
+
+def ns_to_local(ns):
+    """Epoch ns (scalar or Series) as naive local datetimes."""
+    ts = pd.to_datetime(ns, unit="ns", utc=True)
+    if isinstance(ts, pd.Series):
+        return ts.dt.tz_convert(_LOCAL_TZ).dt.tz_localize(None)
+    return ts.tz_convert(_LOCAL_TZ).tz_localize(None)
+
+
+def history_for_display(system: ReferralSystem) -> pd.DataFrame:
+    """History with local-time columns, converted once per history_version."""
+    cached = st.session_state.get("history_display")
+    if cached is None or cached[0] != system.history_version:
+        df = system.referral_history.copy()
+        for col in ("Request Time", "Completion Time"):
+            df[col] = ns_to_local(df[col])
+        cached = (system.history_version, df)
+        st.session_state.history_display = cached
+    return cached[1]
+
+
+# Leaflet is loaded once in the component iframe; reruns only ship the JSON state
+_live_map = components.declare_component(
+    "kcrh_live_map", path=os.path.join(os.path.dirname(os.path.abspath(__file__)), "map_component")
+)
+
+
+def map_state_payload(system: ReferralSystem) -> dict:
+    """JSON-serializable snapshot of everything the map draws."""
+    hospitals = [
+        {"id": h.name, "lat": h.location[0], "lon": h.location[1],
+         "popup": f"{h.name}<br>Beds: {h.available_beds}/{h.capacity}"}
+        for h in system.hospitals
+    ]
+    ambulances = []
+    for amb in system.ambulances:
+        path = []
+        if len(amb.route):
+            stops = [amb.location, amb.route] + ([amb.destination.location] if amb.destination else [])
+            path = np.vstack(stops).tolist()
+        ambulances.append({"id": amb.id, "lat": amb.location[0], "lon": amb.location[1],
+                           "status": amb.status, "popup": f"{amb.id}<br>Status: {amb.status}",
+                           "path": path})
+    return {"center": list(system.hospitals[0].location), "hospitals": hospitals, "ambulances": ambulances}
+
+
+def live_map(system: ReferralSystem):
+    return _live_map(state=map_state_payload(system), key="map", default=None)
+
+
+@st.cache_data(show_spinner=False, max_entries=50, ttl=datetime.timedelta(hours=1))
+def referrals_bar_png(counts: tuple) -> bytes:
+    """Bar chart of completed referrals per receiving hospital, as PNG bytes."""
+    labels = [name for name, _ in counts]
+    values = [n for _, n in counts]
+    # Figure() directly, not pyplot: pyplot's global state is not safe across session threads
+    fig = Figure(figsize=(6, 3))
+    ax = fig.subplots()
+    ax.bar(labels, values, color="tab:blue")
+    ax.set_ylabel("Referrals")
+    ax.set_title("Completed referrals by receiving hospital")
+    ax.tick_params(axis="x", labelrotation=30)
+    fig.tight_layout()
+    buf = io.BytesIO()
+    fig.savefig(buf, format="png", dpi=80)
+    return buf.getvalue()
+
+
+# Bounded: entries hold patient details and the cache is shared across sessions
+@st.cache_data(show_spinner=False, max_entries=200, ttl=datetime.timedelta(hours=1))
+def build_handover_pdf(form: dict) -> bytes:
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.set_font("Arial", size=12)
+    pdf.cell(0, 10, f"Handover Form: {form['form_id']}", ln=True)
+    pdf.cell(0, 10, f"Patient: {form['patient']}", ln=True)
+    pdf.cell(0, 10, f"Condition: {form['condition']}", ln=True)
+    pdf.cell(0, 10, f"From: {form['sending']}", ln=True)
+    pdf.cell(0, 10, f"To: {form['receiving']}", ln=True)
+    pdf.cell(0, 10, f"Vitals: {form['vitals']}", ln=True)
+    out = pdf.output(dest="S")
+    # fpdf 1.x returns a latin-1 str, fpdf2 returns a bytearray
+    return out.encode("latin-1") if isinstance(out, str) else bytes(out)
 
 # -----------------------------
 # Streamlit UI
 # -----------------------------
-st.set_page_config(page_title="Kisumu County Referral System", layout="wide")
 st.title("🏥 Kisumu County Referral Hospital System")
 
-menu = ["Dashboard", "Create Referral", "Ambulance Tracking", "Communications", "Handover Forms", "Offline Queue"]
-choice = st.sidebar.selectbox("Navigation", menu)
-
 # -----------------------------
 # Dashboard
 # -----------------------------
-if choice == "Dashboard":
+@st.fragment
+def dashboard_page():
     st.subheader("Hospital Overview")
-    for hosp in ref_sys.hospitals:
-        st.write(f"**{hosp.name}** ({hosp.type}) - Beds: {hosp.available_beds}/{hosp.capacity}")
-        st.write(f"Referrals received: {len(hosp.referrals_received)}")
+    # Read from the Hospital objects, which own the live bed counts
+    df_hosp = pd.DataFrame(
+        [(h.name, h.type, f"{h.available_beds}/{h.capacity}", len(h.referrals_received))
+         for h in ref_sys.hospitals],
+        columns=["Hospital", "Type", "Beds", "Referrals"],
+    )
+    st.dataframe(df_hosp, hide_index=True)
 
     st.subheader("Referral History")
     df_ref = referrals_to_df(ref_sys)
-    st.dataframe(df_ref)
+    st.dataframe(history_for_display(ref_sys))
+
+    if not df_ref.empty:
+        st.subheader("Analytics")
+        # Keyed on the aggregated counts, so the PNG is redrawn only when they change
+        counts = tuple(df_ref["To Hospital"].value_counts().sort_index().items())
+        st.image(referrals_bar_png(counts))
+
+        transfer_ns = (df_ref["Completion Time"] - df_ref["Request Time"]).to_numpy(dtype=np.int64)
+        st.metric("Average transfer time", f"{transfer_ns.mean() / 60e9:.1f} min")
+
 
 # -----------------------------
 # Create Referral
 # -----------------------------
-elif choice == "Create Referral":
+@st.fragment
+def create_referral_page():
     st.subheader("Create a New Referral")
 
     patient_names = [p.name for p in patients if p.status != "admitted"]
@@ -259,14 +487,15 @@ elif choice == "Create Referral":
         st.warning("No patients available for referral.")
     else:
         selected_patient_name = st.selectbox("Select Patient", patient_names)
-        patient_obj = next((p for p in patients if p.name == selected_patient_name), None)
+        patient_obj = patients_by_name.get(selected_patient_name)
 
-        from_hospital_name = st.selectbox("From Hospital", [h.name for h in ref_sys.hospitals])
-        to_hospital_name = st.selectbox("To Hospital", [h.name for h in ref_sys.hospitals if h.name != from_hospital_name])
+        hosp_names = ref_sys.hosp_names.tolist()
+        from_hospital_name = st.selectbox("From Hospital", hosp_names)
+        to_hospital_name = st.selectbox("To Hospital", [n for n in hosp_names if n != from_hospital_name])
 
         if st.button("Create Referral"):
-            from_hosp_obj = next(h for h in ref_sys.hospitals if h.name == from_hospital_name)
-            to_hosp_obj = next(h for h in ref_sys.hospitals if h.name == to_hospital_name)
+            from_hosp_obj = ref_sys.hospital_by_name(from_hospital_name)
+            to_hosp_obj = ref_sys.hospital_by_name(to_hospital_name)
 
             referral = ref_sys.create_referral(patient_obj, from_hosp_obj, to_hosp_obj)
             if referral:
@@ -274,10 +503,12 @@ elif choice == "Create Referral":
             else:
                 st.error("No available ambulance. Please try again later.")
 
+
 # -----------------------------
 # Ambulance Tracking
 # -----------------------------
-elif choice == "Ambulance Tracking":
+@st.fragment
+def ambulance_tracking_page():
     st.subheader("Ambulance Status")
     for amb in ref_sys.ambulances:
         st.write(f"**{amb.id}** - Status: {amb.status}")
@@ -286,36 +517,14 @@ elif choice == "Ambulance Tracking":
             st.write(f"ETA: {amb.eta if amb.eta else 'Calculating...'}")
 
     st.subheader("Map View")
-    map_center = ref_sys.hospitals[0].location
-    m = folium.Map(location=map_center, zoom_start=12)
-
-    # Plot hospitals
-    for hosp in ref_sys.hospitals:
-        folium.Marker(
-            location=hosp.location,
-            popup=f"{hosp.name}\nBeds: {hosp.available_beds}/{hosp.capacity}",
-            icon=folium.Icon(color="green", icon="plus-sign")
-        ).add_to(m)
-
-    # Plot ambulances
-    for amb in ref_sys.ambulances:
-        color = "blue" if amb.status == "available" else "red"
-        folium.Marker(
-            location=amb.location,
-            popup=f"{amb.id}\nStatus: {amb.status}",
-            icon=folium.Icon(color=color, icon="ambulance")
-        ).add_to(m)
+    live_map(ref_sys)
 
-        if amb.route:
-            folium.PolyLine(locations=[amb.location] + amb.route + ([amb.destination.location] if amb.destination else []),
-                            color="orange", weight=3, opacity=0.7).add_to(m)
-
-    components.html(m._repr_html_(), height=500)
 
 # -----------------------------
 # Communications
 # -----------------------------
-elif choice == "Communications":
+@st.fragment
+def communications_page():
     st.subheader("Send Message")
 
     sender = st.text_input("Sender")
@@ -326,58 +535,49 @@ elif choice == "Communications":
 
     if st.button("Send Message"):
         msg = comm_system.send_message(sender, recipient, msg_type, content, urgent)
-        st.success(f"Message sent! ID: {msg['id']}")
+        st.success(f"Message sent! ID: {msg.id}")
 
     st.subheader("Inbox")
     recipient_inbox = st.text_input("View Inbox for Recipient")
     if recipient_inbox:
         msgs = comm_system.get_messages_for(recipient_inbox)
         for m in msgs:
-            st.write(f"From: {m['sender']} | Type: {m['type']} | Urgent: {m['urgent']}")
-            st.write(f"Content: {m['content']}")
-            st.write(f"Timestamp: {m['timestamp']}")
+            st.write(f"From: {m.sender} | Type: {m.type} | Urgent: {m.urgent}")
+            st.write(f"Content: {m.content}")
+            st.write(f"Timestamp: {ns_to_local(m.timestamp)}")
             st.write("---")
 
+
 # -----------------------------
 # Handover Forms
 # -----------------------------
-elif choice == "Handover Forms":
+@st.fragment
+def handover_forms_page():
     st.subheader("Digital Handover Forms")
 
     handover_system = DigitalHandoverSystem()
     if st.button("Generate Handover PDFs for Completed Referrals"):
-        for idx, row in referrals_to_df(ref_sys).iterrows():
-            patient_name = row["Patient"]
-            patient_obj = next((p for p in patients if p.name == patient_name), None)
+        for row in ref_sys.iter_history():
+            patient_obj = patients_by_name.get(row["Patient"])
             if not patient_obj:
                 continue
 
             referral_dict = {
                 "patient": patient_obj,
-                "from_hospital": next(h for h in ref_sys.hospitals if h.name == row["From Hospital"]),
-                "to_hospital": next(h for h in ref_sys.hospitals if h.name == row["To Hospital"])
+                "from_hospital": ref_sys.hospital_by_name(row["From Hospital"]),
+                "to_hospital": ref_sys.hospital_by_name(row["To Hospital"])
             }
 
             form = handover_system.create_handover(referral_dict)
-
-            pdf = FPDF()
-            pdf.add_page()
-            pdf.set_font("Arial", size=12)
-            pdf.cell(0, 10, f"Handover Form: {form['form_id']}", ln=True)
-            pdf.cell(0, 10, f"Patient: {form['patient']}", ln=True)
-            pdf.cell(0, 10, f"Condition: {form['condition']}", ln=True)
-            pdf.cell(0, 10, f"From: {form['sending']}", ln=True)
-            pdf.cell(0, 10, f"To: {form['receiving']}", ln=True)
-            pdf.cell(0, 10, f"Vitals: {form['vitals']}", ln=True)
-            pdf_output = io.BytesIO()
-            pdf.output(pdf_output)
-            st.download_button(f"Download {form['form_id']}", data=pdf_output.getvalue(),
+            st.download_button(f"Download {form['form_id']}", data=build_handover_pdf(form),
                                file_name=f"{form['form_id']}.pdf")
 
+
 # -----------------------------
 # Offline Queue
 # -----------------------------
-elif choice == "Offline Queue":
+@st.fragment
+def offline_queue_page():
     st.subheader("Offline Queue Management")
     offline_mgr = OfflineManager()
 
@@ -395,3 +595,16 @@ elif choice == "Offline Queue":
 
     st.write("Offline Queue:")
     st.dataframe(pd.DataFrame(offline_mgr.offline_queue))
+
+
+# Each page is a fragment, so widget interactions rerun only that page's body
+PAGES = {
+    "Dashboard": dashboard_page,
+    "Create Referral": create_referral_page,
+    "Ambulance Tracking": ambulance_tracking_page,
+    "Communications": communications_page,
+    "Handover Forms": handover_forms_page,
+    "Offline Queue": offline_queue_page,
+}
+choice = st.sidebar.selectbox("Navigation", list(PAGES))
+PAGES[choice]()
@@ -0,0 +1,30 @@
+# Distance kernels for the KCRH app.
+# Kept in an imported module so Streamlit reruns of app.py reuse the compiled
+# kernel instead of rebuilding it on every interaction.
+
+import numpy as np
+
+# Optional JIT: numba turns the kernel into a compiled numpy ufunc
+try:
+    from numba import vectorize
+except ImportError:
+    vectorize = None
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def _haversine(lat1, lon1, lat2, lon2):
+    # Spherical-earth distance; well under 0.5% error at county scale.
+    # Written with numpy functions so it runs both as array code and inside numba.
+    phi1, phi2 = np.radians(lat1), np.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = np.radians(lon2 - lon1)
+    a = np.sin(dphi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+if vectorize is not None:
+    haversine_km = vectorize(["float64(float64, float64, float64, float64)"],
+                             cache=True, fastmath=True)(_haversine)
+else:
+    haversine_km = _haversine